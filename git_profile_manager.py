@@ -8,11 +8,25 @@ from tkinter import ttk, messagebox, scrolledtext
 import subprocess
 import json
 import os
+import time
+import configparser
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from datetime import datetime
+
+try:
+    import orjson
+except ImportError:  # Optional speed-up; fall back to the standard library
+    orjson = None
 
 
 class GitProfileManager:
+    # How often the Tk thread checks whether background git work has finished
+    _POLL_INTERVAL_MS = 20
+    # Oldest console lines are dropped beyond this many
+    _MAX_LOG_LINES = 5000
+    # git config flag for each apply scope
+    _SCOPE_FLAG = {'global': '--global', 'local': '--local'}
+
     def __init__(self, root):
         self.root = root
         self.root.title("Git Profile Manager")
@@ -21,69 +35,310 @@ class GitProfileManager:
 
         # Configuration file path
         self.config_file = Path.home() / ".git_profile_manager.json"
-        self.profiles = self.load_profiles()
-        self.current_git_config = self.get_current_git_config()
+        # Log entries waiting to be written to the console on the next idle tick
+        self._log_buffer = []
+        self._log_flush_scheduled = False
+        # Created by setup_ui; messages logged before then are dropped
+        self.console_text = None
+        # Profiles are loaded on first access, see the profiles property
+        self._profiles = None
+        self._profile_index = None
+        self._dirty = False
+        # Current git config (only the user.* keys when read from the files directly);
+        # Refresh and Apply always re-read it
+        self._config_snapshot = {}
+        self._snapshot_key = None
+        # Git subprocesses run on this worker so they never block the Tk event loop
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self.current_git_config = self._cached_current_config()
 
         self.setup_ui()
-        self.refresh_profiles_list()
+        # Load profiles once the window is up so file I/O doesn't delay it appearing
+        self.root.after(100, self.refresh_profiles_list)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.log_message("Git Profile Manager started", "INFO")
 
     def log_message(self, message, level="INFO"):
         """Add a log message to the console"""
-        if hasattr(self, 'console_text'):
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            log_entry = f"[{timestamp}] [{level}] {message}\n"
-            self.console_text.insert(tk.END, log_entry)
+        if self.console_text is not None:
+            timestamp = time.strftime("%H:%M:%S")
+            self._log_buffer.append(f"[{timestamp}] [{level}] {message}\n")
+            if not self._log_flush_scheduled:
+                self._log_flush_scheduled = True
+                self.root.after_idle(self._flush_log)
+
+    def _flush_log(self):
+        """Write all buffered log entries to the console in one insert"""
+        self._log_flush_scheduled = False
+        if self._log_buffer:
+            self.console_text.insert(tk.END, ''.join(self._log_buffer))
+            self._log_buffer.clear()
+            line_count = int(self.console_text.index('end-1c').split('.')[0])
+            if line_count > self._MAX_LOG_LINES:
+                self.console_text.delete('1.0', f'{line_count - self._MAX_LOG_LINES}.0')
             self.console_text.see(tk.END)
 
+    @property
+    def profiles(self):
+        """Saved profiles, loaded from the config file on first access"""
+        self._load_profiles_once()
+        return self._profiles
+
+    def _load_profiles_once(self):
+        """Load profiles and build their name index if that hasn't happened yet"""
+        if self._profiles is None:
+            self._profiles = self.load_profiles()
+            self._reindex_profiles()
+
     def load_profiles(self):
         """Load saved profiles from config file"""
         if self.config_file.exists():
             try:
-                with open(self.config_file, 'r') as f:
-                    profiles = json.load(f)
-                    return profiles
+                data = self.config_file.read_bytes()
+                profiles = orjson.loads(data) if orjson else json.loads(data)
+                for profile in profiles:
+                    self._cache_display(profile)
+                return profiles
             except Exception as e:
                 print(f"Error loading profiles: {e}")
                 return []
         return []
 
+    def _reindex_profiles(self):
+        """Rebuild the profile_name -> list index lookup table"""
+        self._profile_index = {p['profile_name']: i for i, p in enumerate(self.profiles)}
+
+    # Layout produced by json.dump(profiles, indent=2) for one profile
+    _PROFILE_JSON_TEMPLATE = ('  {{\n    "profile_name": {},\n    "name": {},\n'
+                              '    "email": {}\n  }}')
+
+    def _serialize_profiles(self):
+        """Encode profiles as JSON bytes using their fixed schema (cached fields are dropped)"""
+        if orjson:
+            return orjson.dumps([{'profile_name': p['profile_name'], 'name': p['name'], 'email': p['email']}
+                                 for p in self.profiles], option=orjson.OPT_INDENT_2)
+        if not self.profiles:
+            return b'[]'
+        # The schema is fixed, so encode just the three fields instead of whole dicts;
+        # json.dumps takes its string fast path and still copes with hand-edited values
+        template = self._PROFILE_JSON_TEMPLATE
+        rows = [template.format(json.dumps(p['profile_name']), json.dumps(p['name']),
+                                json.dumps(p['email']))
+                for p in self.profiles]
+        return ('[\n' + ',\n'.join(rows) + '\n]').encode('ascii')
+
     def save_profiles(self):
-        """Save profiles to config file"""
+        """Save profiles to config file if they changed since the last save"""
+        if not self._dirty:
+            return
+        # Write to a temporary file first so a crash never leaves a truncated config
+        tmp_file = self.config_file.with_suffix('.json.tmp')
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(self.profiles, f, indent=2)
+            data = self._serialize_profiles()
+            tmp_file.write_bytes(data)
+            os.replace(tmp_file, self.config_file)
+            self._dirty = False
             self.log_message(f"Profiles saved to {self.config_file}", "SUCCESS")
         except Exception as e:
+            try:
+                tmp_file.unlink()
+            except OSError:
+                pass
             self.log_message(f"Failed to save profiles: {e}", "ERROR")
             messagebox.showerror("Error", f"Failed to save profiles: {e}")
 
     def get_current_git_config(self):
-        """Get current Git configuration"""
-        try:
-            name = subprocess.check_output(['git', 'config', 'user.name'],
-                                         stderr=subprocess.DEVNULL).decode().strip()
-            email = subprocess.check_output(['git', 'config', 'user.email'],
-                                          stderr=subprocess.DEVNULL).decode().strip()
-            self.log_message(f"Current config: {name} <{email}>", "INFO")
-            return {'name': name, 'email': email}
-        except subprocess.CalledProcessError:
-            self.log_message("No Git configuration found", "WARNING")
-            return {'name': 'Not configured', 'email': 'Not configured'}
+        """Get current Git configuration from the config snapshot"""
+        return {'name': self._config_snapshot.get('user.name') or 'Not configured',
+                'email': self._config_snapshot.get('user.email') or 'Not configured'}
 
-    def set_git_config(self, name, email, scope='local'):
-        """Set Git configuration"""
+    def _log_git_config(self, config):
+        """Log the Git configuration that was just read"""
+        if config['name'] == 'Not configured' and config['email'] == 'Not configured':
+            self.log_message("No Git configuration found", "WARNING")
+        else:
+            self.log_message(f"Current config: {config['name']} <{config['email']}>", "INFO")
+
+    def _read_config_snapshot(self):
+        """Read the git config (safe to call off the Tk thread)"""
+        # Parsing the config files directly avoids spawning git at all
+        snapshot = self._read_user_config_files()
+        if snapshot is None:
+            snapshot = self._read_git_config_list()
+        return snapshot
+
+    # Environment variables that change which config git reads
+    _GIT_CONFIG_ENV_VARS = ('GIT_DIR', 'GIT_CONFIG', 'GIT_CONFIG_GLOBAL', 'GIT_CONFIG_COUNT',
+                            'GIT_CONFIG_PARAMETERS', 'GIT_CEILING_DIRECTORIES')
+
+    def _read_user_config_files(self):
+        """Read user.name and user.email from ~/.gitconfig and the local repository config
+
+        Returns None whenever the result might differ from what git reports, so the
+        caller can fall back to asking git.
+        """
+        if any(var in os.environ for var in self._GIT_CONFIG_ENV_VARS):
+            return None
+        paths = [Path.home() / '.gitconfig']
+        git_dir = self._find_git_dir()
+        if git_dir is not None:
+            # Worktrees and submodules use a .git file pointing elsewhere
+            if not git_dir.is_dir() or (git_dir / 'config.worktree').exists():
+                return None
+            paths.append(git_dir / 'config')
+
+        snapshot = {}
+        for path in paths:
+            user = self._parse_user_section(path)
+            if user is None:
+                return None
+            # Local values override global ones
+            snapshot.update(user)
+        # The keys may come from files we don't read, such as the system config
+        if 'user.name' not in snapshot or 'user.email' not in snapshot:
+            return None
+        return snapshot
+
+    @staticmethod
+    def _parse_user_section(path):
+        """Parse the [user] section of a git config file, or None if it can't be parsed safely"""
+        # git only uses '=' as a delimiter and has no DEFAULT section; a section header
+        # can never contain a newline, so no real section is treated as defaults
+        parser = configparser.ConfigParser(strict=False, interpolation=None, allow_no_value=True,
+                                           delimiters=('=',), default_section='\n')
+        try:
+            with open(path, encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            return {}
+        except (OSError, UnicodeDecodeError):
+            return None
+        # git allows a key after the section header ("[user]email = ..."), configparser drops it
+        for line in text.splitlines():
+            line = line.strip()
+            if line.startswith('[') and line[line.find(']') + 1:].strip():
+                return None
         try:
-            scope_flag = '--global' if scope == 'global' else '--local'
-            self.log_message(f"Setting Git config ({scope}): {name} <{email}>", "INFO")
-            subprocess.run(['git', 'config', scope_flag, 'user.name', name], check=True)
-            subprocess.run(['git', 'config', scope_flag, 'user.email', email], check=True)
+            parser.read_string(text, source=str(path))
+        except configparser.Error:
+            return None
+
+        user = {}
+        for section in parser.sections():
+            name = section.lower()
+            # git rejects padded headers such as "[ user ]"; let it report that
+            if name != name.strip() or name.startswith('include'):
+                return None
+            if name != 'user':
+                continue
+            # Keys git wouldn't accept (e.g. "name: Foo") make the whole file invalid
+            if not all(option.replace('-', '').isalnum() for option in parser[section]):
+                return None
+            for key in ('name', 'email'):
+                value = parser[section].get(key, fallback=False)
+                if value is False:
+                    continue
+                # Leave quoting, escapes, comments, continuations and tab normalization to git
+                if value is None or any(c in value for c in '"\\#;\n\t'):
+                    return None
+                user[f'user.{key}'] = value
+        return user
+
+    @staticmethod
+    def _find_git_dir():
+        """Return the .git entry of the repository containing the cwd, or None"""
+        cwd = Path.cwd()
+        for directory in (cwd, *cwd.parents):
+            git_dir = directory / '.git'
+            if git_dir.exists():
+                return git_dir
+        return None
+
+    def _read_git_config_list(self):
+        """Read every git config key with a single git call"""
+        # Decoded by hand rather than with text=True, which would also translate any
+        # carriage returns inside values; the whole output is still decoded only once
+        result = subprocess.run(['git', 'config', '--list', '-z'],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        snapshot = {}
+        if result.returncode == 0:
+            # Entries are NUL-terminated "key\nvalue" pairs, so multiline values survive
+            for entry in result.stdout.decode('utf-8', 'replace').split('\0'):
+                if entry:
+                    key, _, value = entry.partition('\n')
+                    # Later entries (e.g. local over global) take precedence
+                    snapshot[key] = value
+        return snapshot
+
+    def _config_snapshot_key(self):
+        """Key identifying the config files the snapshot was read from"""
+        git_dir = self._find_git_dir()
+        return (os.getcwd(), git_dir and self._file_mtime(git_dir / 'config'),
+                self._file_mtime(Path.home() / '.gitconfig'))
+
+    def _store_config_snapshot(self, key, snapshot):
+        """Replace the config snapshot and log the resulting Git identity"""
+        self._snapshot_key = key
+        self._config_snapshot = snapshot
+        self._log_git_config(self.get_current_git_config())
+
+    def _cached_current_config(self):
+        """Get current Git configuration, re-reading git only if a config file changed"""
+        key = self._config_snapshot_key()
+        if key != self._snapshot_key:
+            self._store_config_snapshot(key, self._read_config_snapshot())
+        return self.get_current_git_config()
+
+    @staticmethod
+    def _file_mtime(path):
+        """Return the modification time of a file, or None if it doesn't exist"""
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _run_in_background(self, func, callback, *args):
+        """Run func(*args) on the worker thread and pass its result to callback on the Tk thread"""
+        future = self._executor.submit(func, *args)
+        self._poll_future(future, callback)
+
+    def _poll_future(self, future, callback):
+        """Deliver a finished future's result, or check again on the next poll"""
+        if future.done():
+            callback(future.result())
+        else:
+            self.root.after(self._POLL_INTERVAL_MS, self._poll_future, future, callback)
+
+    def set_git_config(self, name, email, scope='local', callback=None):
+        """Set Git configuration in the background, then call callback(success)"""
+        scope_flag = self._SCOPE_FLAG[scope]
+        self.log_message(f"Setting Git config ({scope}): {name} <{email}>", "INFO")
+        self._run_in_background(self._run_git_config_writes,
+                                lambda failure: self._on_git_config_set(scope, failure, callback),
+                                scope_flag, [('user.name', name), ('user.email', email)])
+
+    def _on_git_config_set(self, scope, failure, callback):
+        """Report the result of set_git_config"""
+        if failure:
+            key, error = failure
+            self.log_message(f"Failed to set Git config ({key}): {error}", "ERROR")
+            messagebox.showerror("Error", f"Failed to set Git config ({key}): {error}")
+        else:
             self.log_message(f"Git config applied successfully ({scope})", "SUCCESS")
-            return True
-        except subprocess.CalledProcessError as e:
-            self.log_message(f"Failed to set Git config: {e}", "ERROR")
-            messagebox.showerror("Error", f"Failed to set Git config: {e}")
-            return False
+        # Force the next read even if the mtime didn't visibly change
+        self._snapshot_key = None
+        if callback:
+            callback(not failure)
+
+    def _run_git_config_writes(self, scope_flag, entries):
+        """Write config entries, returning (key, error) for the first failure or None"""
+        for key, value in entries:
+            result = subprocess.run(['git', 'config', scope_flag, key, value],
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                    encoding='utf-8', errors='replace')
+            if result.returncode != 0:
+                return key, result.stderr.strip() or f"exit status {result.returncode}"
+        return None
 
     def setup_ui(self):
         """Setup the user interface"""
@@ -189,26 +444,75 @@ class GitProfileManager:
         profiles_frame.rowconfigure(0, weight=1)
         add_frame.columnconfigure(1, weight=1)
 
+    def on_close(self):
+        """Flush any unsaved profiles before closing the window"""
+        self.save_profiles()
+        self._executor.shutdown()
+        self.root.destroy()
+
     def clear_console(self):
         """Clear the console log"""
+        self._log_buffer.clear()
         self.console_text.delete(1.0, tk.END)
         self.log_message("Console cleared", "INFO")
 
     def refresh_current_config(self):
         """Refresh the current Git configuration display"""
         self.log_message("Refreshing current Git configuration", "INFO")
+        # Always re-read: the mtime key can't see changes made through worktrees or include files
+        self._snapshot_key = None
+        key = self._config_snapshot_key()
+        self._run_in_background(self._read_config_snapshot,
+                                lambda snapshot: self._apply_config_snapshot(key, snapshot))
+
+    def _apply_config_snapshot(self, key, snapshot):
+        """Store and display a config snapshot read in the background"""
+        self._store_config_snapshot(key, snapshot)
+        self._show_current_config()
+
+    def _show_current_config(self):
+        """Display the Git configuration from the current snapshot"""
         self.current_git_config = self.get_current_git_config()
         self.current_name_label.config(text=self.current_git_config['name'])
         self.current_email_label.config(text=self.current_git_config['email'])
 
     def refresh_profiles_list(self):
-        """Refresh the profiles listbox"""
+        """Redraw the whole profiles listbox (mutations update single rows instead)"""
+        self._reindex_profiles()
         self.profiles_listbox.delete(0, tk.END)
         for profile in self.profiles:
-            display_text = f"{profile['profile_name']:20} | {profile['name']:20} | {profile['email']}"
-            self.profiles_listbox.insert(tk.END, display_text)
+            self.profiles_listbox.insert(tk.END, profile['_display'])
         self.log_message(f"Loaded {len(self.profiles)} profile(s)", "INFO")
 
+    @staticmethod
+    def _cache_display(profile):
+        """Precompute the listbox row for a profile (not persisted)"""
+        profile['_display'] = f"{profile['profile_name']:20} | {profile['name']:20} | {profile['email']}"
+
+    def _append_profile(self, profile):
+        """Add a profile to the end of the list and the listbox"""
+        self._cache_display(profile)
+        self.profiles.append(profile)
+        self._profile_index[profile['profile_name']] = len(self.profiles) - 1
+        self._dirty = True
+        self.profiles_listbox.insert(tk.END, profile['_display'])
+
+    def _replace_profile(self, index, profile):
+        """Replace the profile at index in place, keeping its listbox position"""
+        self._cache_display(profile)
+        self.profiles[index] = profile
+        self._dirty = True
+        self.profiles_listbox.delete(index)
+        self.profiles_listbox.insert(index, profile['_display'])
+
+    def _remove_profile(self, index):
+        """Remove the profile at index from the list and the listbox"""
+        profile = self.profiles.pop(index)
+        self._reindex_profiles()
+        self._dirty = True
+        self.profiles_listbox.delete(index)
+        return profile
+
     def populate_current_config(self):
         """Populate the form with current Git configuration"""
         self.git_name_entry.delete(0, tk.END)
@@ -233,26 +537,26 @@ class GitProfileManager:
             messagebox.showwarning("Warning", "All fields are required!")
             return
 
-        # Check if profile already exists
-        for profile in self.profiles:
-            if profile['profile_name'] == profile_name:
-                if not messagebox.askyesno("Confirm",
-                    f"Profile '{profile_name}' already exists. Overwrite?"):
-                    return
-                self.log_message(f"Overwriting existing profile: {profile_name}", "INFO")
-                self.profiles.remove(profile)
-                break
-
-        # Add new profile
-        self.profiles.append({
+        profile = {
             'profile_name': profile_name,
             'name': git_name,
             'email': git_email
-        })
+        }
+
+        # Check if profile already exists
+        self._load_profiles_once()
+        if profile_name in self._profile_index:
+            if not messagebox.askyesno("Confirm",
+                f"Profile '{profile_name}' already exists. Overwrite?"):
+                return
+            self.log_message(f"Overwriting existing profile: {profile_name}", "INFO")
+            self._replace_profile(self._profile_index[profile_name], profile)
+        else:
+            # Add new profile
+            self._append_profile(profile)
 
         self.log_message(f"Added profile: {profile_name} ({git_name} <{git_email}>)", "SUCCESS")
         self.save_profiles()
-        self.refresh_profiles_list()
 
         # Clear the form
         self.profile_name_entry.delete(0, tk.END)
@@ -261,20 +565,26 @@ class GitProfileManager:
 
         messagebox.showinfo("Success", f"Profile '{profile_name}' added successfully!")
 
-    def backup_current_profile(self):
-        """Backup current Git configuration as a profile if not already saved"""
-        current = self.get_current_git_config()
+    def backup_current_profile(self, current=None):
+        """Backup current Git configuration as a profile if not already saved
+
+        Callers that have just read the config pass it as current; otherwise the last
+        snapshot is used, so this never runs git on the Tk thread.
+        """
+        if current is None:
+            current = self.get_current_git_config()
 
         # Skip if not configured
         if current['name'] == 'Not configured' or current['email'] == 'Not configured':
             self.log_message("Skipping backup: No Git config to backup", "INFO")
             return False
 
+        identities = {(p['name'], p['email']) for p in self.profiles}
+
         # Check if this profile already exists
-        for profile in self.profiles:
-            if profile['name'] == current['name'] and profile['email'] == current['email']:
-                self.log_message("Skipping backup: Profile already exists", "INFO")
-                return False  # Already saved, no need to backup
+        if (current['name'], current['email']) in identities:
+            self.log_message("Skipping backup: Profile already exists", "INFO")
+            return False  # Already saved, no need to backup
 
         # Generate a backup profile name
         base_name = f"{current['name']}_backup"
@@ -282,12 +592,12 @@ class GitProfileManager:
         counter = 1
 
         # Ensure unique profile name
-        while any(p['profile_name'] == backup_name for p in self.profiles):
+        while backup_name in self._profile_index:
             backup_name = f"{base_name}_{counter}"
             counter += 1
 
         # Add backup profile
-        self.profiles.append({
+        self._append_profile({
             'profile_name': backup_name,
             'name': current['name'],
             'email': current['email']
@@ -308,26 +618,39 @@ class GitProfileManager:
         profile = self.profiles[selection[0]]
         self.log_message(f"Attempting to apply profile: {profile['profile_name']}", "INFO")
 
-        # Get current config before applying new one
+        # Re-read the current config in the background before applying the new one; always
+        # read fresh, since the mtime key misses include files, worktree configs and the XDG config
+        key = self._config_snapshot_key()
+        self._run_in_background(self._read_config_snapshot,
+                                lambda snapshot: self._apply_profile_over(profile, scope, key, snapshot))
+
+    def _apply_profile_over(self, profile, scope, key, snapshot):
+        """Back up the freshly read config if needed, then apply the profile"""
+        self._store_config_snapshot(key, snapshot)
         current = self.get_current_git_config()
 
         # Check if current config is different from the one being applied
         if (current['name'] != profile['name'] or current['email'] != profile['email']):
             # Backup current profile if it's not already saved
-            was_backed_up = self.backup_current_profile()
+            was_backed_up = self.backup_current_profile(current)
         else:
             self.log_message("Profile already active, no backup needed", "INFO")
             was_backed_up = False
 
         # Apply the new profile
-        if self.set_git_config(profile['name'], profile['email'], scope):
-            self.refresh_current_config()
-            self.refresh_profiles_list()  # Refresh to show backup if added
-            scope_text = "repository" if scope == "local" else "globally"
+        self.set_git_config(profile['name'], profile['email'], scope,
+                            lambda success: self._on_profile_applied(success, profile, scope, was_backed_up))
+
+    def _on_profile_applied(self, success, profile, scope, was_backed_up):
+        """Update the UI once set_git_config has finished"""
+        if not success:
+            return
+        self.refresh_current_config()
+        scope_text = "repository" if scope == "local" else "globally"
 
-            backup_msg = "\n\nPrevious configuration was automatically backed up." if was_backed_up else ""
-            messagebox.showinfo("Success",
-                f"Profile '{profile['profile_name']}' applied {scope_text}!{backup_msg}")
+        backup_msg = "\n\nPrevious configuration was automatically backed up." if was_backed_up else ""
+        messagebox.showinfo("Success",
+            f"Profile '{profile['profile_name']}' applied {scope_text}!{backup_msg}")
 
     def delete_profile(self):
         """Delete the selected profile"""
@@ -342,9 +665,8 @@ class GitProfileManager:
         if messagebox.askyesno("Confirm",
             f"Are you sure you want to delete profile '{profile['profile_name']}'?"):
             self.log_message(f"Deleting profile: {profile['profile_name']}", "INFO")
-            self.profiles.pop(selection[0])
+            self._remove_profile(selection[0])
             self.save_profiles()
-            self.refresh_profiles_list()
             self.log_message(f"Profile '{profile['profile_name']}' deleted successfully", "SUCCESS")
             messagebox.showinfo("Success", "Profile deleted successfully!")
 